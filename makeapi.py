@@ -1,72 +1,148 @@
-from typing import Callable
-from abc import ABC, abstractmethod
+from typing import Callable, ClassVar, Final, Iterator
+from collections import deque
+import asyncio
 import os
-from dataclasses import dataclass
+import subprocess
 from enum import Enum
 import json
 import atexit
 import shutil
-import filecmp
 import hashlib
+import heapq
+import shlex
+import time
+import sys
+import threading
+try:
+    import blake3 # type: ignore
+except ImportError: # blake3 is optional, BLAKE2b from hashlib is used instead
+    blake3 = None
+# These are only needed when compiling with mypyc:
+# - Node and rule classes allow interpreted subclasses, so build scripts can still extend them.
+# - Node and FileNode are traits, so file nodes can combine FileNode with a node kind (StaticNode or DynamicNode).
+#   The node kinds declare 'get_id' and 'get_time' again rather than only inheriting them from the Node trait,
+#   otherwise compiled calls through them would not reach the implementations of subclasses defined by build scripts.
+#   The file nodes then explicitly take these from FileNode, since the node kind is listed first.
+try:
+    from mypy_extensions import trait, mypyc_attr
+except ImportError:
+    def trait(cls): # type: ignore
+        return cls
+    def mypyc_attr(*attrs, **kwattrs): # type: ignore
+        return lambda cls: cls
 
 DATABASE_FILENAME = "makeapi_database.json"
+NINJA_FILENAME = "build.ninja"
 class Database:
     """
     This database is internal to the implementation of make API, and i used to store persistant information
     regarding the states of the objects managed by the build system
     """
-    def __init__(self):
-        if not os.path.exists(DATABASE_FILENAME):
+    def __init__(self) -> None:
+        self._synced: bytes = b"" # The content of the database file, as it was last read or written
+        try:
+            # Read with a single call, json.loads accepts the bytes directly:
+            with open(DATABASE_FILENAME, 'rb') as f:
+                self._synced = f.read()
+            self.data = json.loads(self._synced)
+        except FileNotFoundError:
             self.data = dict()
-        else:
-            self.data = json.load(open(DATABASE_FILENAME, 'r'))
+
+        # The tables are created once here, so they can be accessed directly as attributes (see the accessors using them for details):
+        self.clone_paths: dict[str, str] = self.data.setdefault("clone_paths", dict())
+        self.clone_hashes: dict[str, str] = self.data.setdefault("clone_hashes", dict())
+        self.modified_hashes: dict[str, list[int | str] | str] = self.data.setdefault("modified_hashes", dict())
+        self.durations: dict[str, float] = self.data.setdefault("durations", dict())
+        self.dep_hashes: dict[str, dict[str, str]] = self.data.setdefault("dep_hashes", dict())
+        self.dep_hash_times: dict[str, int] = self.data.setdefault("dep_hash_times", dict())
+        self.build_snapshots: dict[str, dict[str, int | None]] = self.data.setdefault("build_snapshots", dict())
         atexit.register(self.sync) # This ensures sync will be called if the program is interrupted or exits normally
 
     def sync(self) -> None:
-        json.dump(self.data, open(DATABASE_FILENAME, 'w'), indent=4)
+        """
+        The file is only written if the data changed since it was last read or written.
+        It is written to a temporary file which then replaces the database, so an interrupted sync would not corrupt it.
+        """
+        # Encoded at once and compactly (the C encoder is only used without indentation), and then written with a single call:
+        payload: bytes = json.dumps(self.data, separators=(',', ':')).encode()
+        if payload == self._synced:
+            return
+        tmp_path: str = DATABASE_FILENAME + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, DATABASE_FILENAME)
+        self._synced = payload
 
     def clean(self) -> None:
-        if os.path.exists(DATABASE_FILENAME):
+        try:
             os.remove(DATABASE_FILENAME)
+        except FileNotFoundError:
+            pass
         atexit.unregister(self.sync)
 
 DATABASE: None | Database = None
+_DATABASE_LOCK: Final = threading.Lock()
 def get_db() -> Database:
     global DATABASE
     if DATABASE is None:
-        DATABASE = Database()
+        # Rules executed concurrently may be the first to access the database:
+        with _DATABASE_LOCK:
+            if DATABASE is None:
+                DATABASE = Database()
     return DATABASE
 
+_FILE_LOCKS: Final[dict[str, threading.Lock]] = dict()
+_FILE_LOCKS_LOCK: Final = threading.Lock()
+def get_file_lock(file_id: str) -> threading.Lock:
+    """Returns a lock for the file with the given id, which should be held while modifying it"""
+    with _FILE_LOCKS_LOCK:
+        if file_id not in _FILE_LOCKS:
+            _FILE_LOCKS[file_id] = threading.Lock()
+        return _FILE_LOCKS[file_id]
+
 class BuildState(Enum):
     CLEAN = "clean"
     DIRTY = "dirty" 
     BUILT = "built" 
 
-class Node(ABC):
-    @abstractmethod
+@mypyc_attr(allow_interpreted_subclasses=True)
+@trait
+class Node:
+    __slots__ = ()
+
+    # Checked instead of 'isinstance(node, DynamicNode)' when traversing the DAG:
+    _is_dynamic: ClassVar[bool] = False
+
     def get_id(self) -> str:
         """A unique identifier used to distinguish this node from others"""
-        pass
+        raise NotImplementedError
     
-    @abstractmethod
-    def get_time(self) -> float | None:
-        """Returns the creation time or None if this Node was not created yet"""
-        pass
+    def get_time(self) -> int | None:
+        """Returns the creation time (in nanoseconds) or None if this Node was not created yet"""
+        raise NotImplementedError
 
+@mypyc_attr(allow_interpreted_subclasses=True)
 class StaticNode(Node):
     """
     Static nodes exist regardless of this build system.
     They may be used by it, but are not generated or modified by it.
     """
-    def _raise_not_exist(self, cause) -> None:
+    __slots__ = ()
+
+    def get_id(self) -> str:
+        raise NotImplementedError
+
+    def get_time(self) -> int | None:
+        raise NotImplementedError
+
+    def _raise_not_exist(self, cause: str) -> None:
         if cause != "":
             cause = f" : {cause}"
         raise RuntimeError(f"Expected static node '{self.get_id()}' to exist{cause}")
 
-    @abstractmethod
     def _check_exists(self) -> str | None:
         """Return None if exists or str explaining why it does not exist"""
-        pass
+        raise NotImplementedError
 
     def verify_exists(self) -> None:
         """Check if file exists and raise an error if not"""
@@ -74,32 +150,67 @@ class StaticNode(Node):
         if res is not None:
             self._raise_not_exist(res)
 
+@mypyc_attr(allow_interpreted_subclasses=True)
 class DynamicNode(Node):
     """
     Dynamic nodes are managed by the build system.
     They do not exist when the build system is in it's clean state.
     Each dynamic node in the build system should have a rule to generate it.
     """
-    
-    @abstractmethod
+    __slots__ = ()
+
+    _is_dynamic: ClassVar[bool] = True
+
+    def get_id(self) -> str:
+        raise NotImplementedError
+
+    def get_time(self) -> int | None:
+        raise NotImplementedError
+
     def clean(self) -> None:
         """Clean any resource associated with this dynamic node"""
-        pass
+        raise NotImplementedError
+
+def get_content_hash(path: str) -> str:
+    """Returns a digest of the file's content, using BLAKE3 (SIMD accelerated and multithreaded) if it is installed"""
+    hasher = blake3.blake3(max_threads=blake3.blake3.AUTO) if blake3 is not None else hashlib.blake2b()
+    with open(path, 'rb') as f:
+        while chunk := f.read(1 << 20):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def get_mtime(path: str) -> int | None:
+    """Returns the modification time (in nanoseconds) of the file, or None if it cannot be accessed, using a single system call"""
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
 
-@dataclass
+@mypyc_attr(allow_interpreted_subclasses=True)
+@trait
 class FileNode(Node):
-    path: str
+    __slots__ = ('path',)
+
+    def __init__(self, path: str) -> None:
+        self.path: str = sys.intern(path)
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(path={self.path!r})"
 
     def get_id(self) -> str:
         return self.path
 
-    def get_time(self) -> float | None:
+    def get_time(self) -> int | None:
+        return get_mtime(self.path)
+
+    def get_hash(self) -> str | None:
+        """Returns a digest of the file's content or None if it does not exist"""
         try:
-            return os.path.getmtime(self.path)
+            return get_content_hash(self.path)
         except FileNotFoundError:
             return None
 
-@dataclass
+@mypyc_attr(allow_interpreted_subclasses=True)
 class FileModificationNode(DynamicNode):
     """
     This node does not represent the file itself,
@@ -108,20 +219,23 @@ class FileModificationNode(DynamicNode):
     One modification to the file may invalidate a previous modification to it.
     """
 
-    modified_file: FileNode
-    modification_key: str
+    __slots__ = ('modified_file', 'modification_key', '_id')
 
-    def get_id(self):
-        return f"{self.modified_file.get_id()}_{self.modification_key}"
+    def __init__(self, modified_file: FileNode, modification_key: str) -> None:
+        self.modified_file: FileNode = modified_file
+        self.modification_key: str = modification_key
+        self._id: str = sys.intern(f"{modified_file.get_id()}_{modification_key}")
 
-    def get_time(self) -> float | None:
-        path: str | None = self.get_clone_file_path()
-        if path is None:
-            return None
-        try:
-            return os.path.getmtime(path)
-        except FileNotFoundError:
-            return None
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(modified_file={self.modified_file!r}, modification_key={self.modification_key!r})"
+
+    def get_id(self) -> str:
+        return self._id
+
+    def get_time(self) -> int | None:
+        # The clone path is not taken from 'get_clone_file_path', which would access the clone file once more to verify it exists:
+        path: str | None = self._get_clone_paths().get(self.modified_file.get_id())
+        return None if path is None else get_mtime(path)
 
     def _get_clone_paths(self) -> dict[str, str]:
         """
@@ -129,10 +243,14 @@ class FileModificationNode(DynamicNode):
         This is used to store paths of clones of files which are made before modifying them.
         """
         #TODO: verify 'clone_paths' is synced back to database with current code.
-        db = get_db().data
-        if "clone_paths" not in db.keys():
-            db["clone_paths"] = dict()
-        return db["clone_paths"] # typing: ignore
+        return get_db().clone_paths
+
+    def _get_clone_hashes(self) -> dict[str, str]:
+        """
+        Returns a reference to the clone hashes dictionary from the persistant global database.
+        It maps each modified file (like 'clone_paths') to the md5sum of it's clone, so the clone does not have to be read again.
+        """
+        return get_db().clone_hashes
 
     def clean(self) -> None:
         path: str | None = self.get_clone_file_path()
@@ -145,72 +263,255 @@ class FileModificationNode(DynamicNode):
         shutil.move(path, self.modified_file.path)
         
         # Cleanup in the database:
+        file_id: str = self.modified_file.get_id()
         clone_paths: dict[str, str] = self._get_clone_paths()
-        del clone_paths[self.modified_file.get_id()]
+        del clone_paths[file_id]
+        self._get_clone_hashes().pop(file_id, None)
 
-    def create_clone_file(self) -> None:
+    def create_clone_file(self, content_hash: str | None = None) -> None:
+        """content_hash: The md5sum of the modified file if it is already known, so the clone would not have to be hashed"""
         clone_paths: dict[str, str] = self._get_clone_paths()
         head, tail = os.path.split(self.modified_file.path)
         new_clone_path = os.path.join(head, f"__clone__{tail}")
         
         # Verify not requesting to clone a file which already has a clone:
-        assert self.modified_file.get_id() not in clone_paths.keys()
+        file_id: str = self.modified_file.get_id()
+        assert file_id not in clone_paths
         if os.path.exists(new_clone_path):
             print(f"Warning: clone file '{new_clone_path}' already exists. Overriding.")
 
         shutil.copy(self.modified_file.path, new_clone_path)
-        clone_paths[self.modified_file.get_id()] = new_clone_path
+        clone_paths[file_id] = new_clone_path
+        self._get_clone_hashes()[file_id] = get_md5sum(new_clone_path) if content_hash is None else content_hash
 
     def get_clone_file_path(self) -> str | None:
         clone_paths: dict[str, str] = self._get_clone_paths()
         
         # The ID used in the 'clone_paths' dict is that of the modified file, not of the modification.
         # This makes more sense since theoretically - a single modification might modify multiple files, and different modifications may target the same file.
-        
-        if self.modified_file.get_id() not in clone_paths.keys():
+        file_id: str = self.modified_file.get_id()
+        if file_id not in clone_paths:
             return None
         else:
-            assert os.path.exists(clone_paths[self.modified_file.get_id()])
-            return clone_paths[self.modified_file.get_id()]
+            assert os.path.exists(clone_paths[file_id])
+            return clone_paths[file_id]
 
+    def get_clone_hash(self) -> str | None:
+        """Returns the md5sum of the clone file, or None if there is no clone"""
+        path: str | None = self.get_clone_file_path()
+        if path is None:
+            return None
+        file_id: str = self.modified_file.get_id()
+        clone_hashes: dict[str, str] = self._get_clone_hashes()
+        if file_id not in clone_hashes:
+            # The clone was made before it's hash was stored:
+            clone_hashes[file_id] = get_md5sum(path)
+        return clone_hashes[file_id]
+
+@mypyc_attr(allow_interpreted_subclasses=True)
 class CreatedFileNode(DynamicNode, FileNode):
+    __slots__ = ()
+
+    def get_id(self) -> str:
+        return FileNode.get_id(self)
+
+    def get_time(self) -> int | None:
+        return FileNode.get_time(self)
+
     def clean(self) -> None:
-        if os.path.exists(self.path):
-            print(f"Removing file: '{self.path}'")
+        # Removing right away takes one system call, rather than checking whether the file exists first:
+        try:
             os.remove(self.path)
+        except FileNotFoundError:
+            return
+        print(f"Removed file: '{self.path}'")
 
+@mypyc_attr(allow_interpreted_subclasses=True)
 class StaticFileNode(StaticNode, FileNode):
+    __slots__ = ()
+
+    def get_id(self) -> str:
+        return FileNode.get_id(self)
+
+    def get_time(self) -> int | None:
+        return FileNode.get_time(self)
+
     def _check_exists(self) -> str | None:
-        if not os.path.exists(self.path):
+        try:
+            os.stat(self.path)
+        except FileNotFoundError:
             return "File not found"
+        except OSError as e:
+            return str(e)
         return None
 
-@dataclass
-class Rule(ABC):
+@mypyc_attr(allow_interpreted_subclasses=True)
+class Rule:
     """
-    'Rule' might be a good place to add resource locks when later adding multiprocessing.
+    'Rule' might be a good place to add resource locks, since rules may be executed concurrently by the build system.
     """
-    target: DynamicNode
-    depends_on: list[Node]
+    __slots__ = ('target', 'depends_on', '_target_id', '_dep_ids', '_found_built')
+
+    def __init__(self, target: DynamicNode, depends_on: list[Node]) -> None:
+        self.target: DynamicNode = target
+
+        # The ids of the target and dependencies are computed once, since they are needed whenever the DAG is traversed:
+        self._target_id: str = target.get_id()
+
+        # Dependencies listed multiple times would only add redundant edges to the DAG:
+        unique_deps: dict[str, Node] = dict()
+        for dep in depends_on:
+            unique_deps.setdefault(dep.get_id(), dep)
+        if len(unique_deps) < len(depends_on):
+            print(f"Warning: the rule for '{self._target_id}' lists some dependencies multiple times. Ignoring duplicates.")
+        self.depends_on: list[Node] = list(unique_deps.values())
+        self._dep_ids: list[str] = list(unique_deps.keys())
+
+        # Set by rules which found their target already built when executed (see ModificationRule), so the duration is not recorded:
+        self._found_built: bool = False
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}(target={self.target!r}, depends_on={self.depends_on!r})"
 
     # @abstractmethod
     # def is_up_to_date(self) -> bool:
     #     pass
 
-    @abstractmethod
     def execute(self) -> None:
-        pass
+        raise NotImplementedError
 
-    def is_up_to_date(self) -> bool:
-        res: float | None = self.target.get_time()
-        if res is None:
+    async def execute_async(self) -> None:
+        """
+        Executed by the build system, so rules can be executed concurrently.
+        By default 'execute' runs in a worker thread, rules which wait on processes should rather override this.
+        """
+        await asyncio.to_thread(self.execute)
+
+    def _get_durations(self) -> dict[str, float]:
+        return get_db().durations
+
+    @property
+    def last_duration(self) -> float | None:
+        """The wall time (in seconds) of the last execution of this rule, or None if it was never executed"""
+        return self._get_durations().get(self._target_id)
+
+    async def timed_execute(
+        self,
+        get_time: Callable[[Node], int | None] = lambda node: node.get_time(),
+        get_hash: Callable[[FileNode], str | None] = lambda node: node.get_hash(),
+    ) -> None:
+        """
+        Execute the rule, and persist how long it took for scheduling future builds.
+        'get_time' and 'get_hash' can be specified to override how the times and hashes of the dependencies are obtained (e.g. from a cache).
+        """
+        # The dependencies are hashed before executing (in a worker thread, since it reads them),
+        # so the recorded hashes are of the contents the target is created from, even if a dependency changes meanwhile:
+        hashes: dict[str, str] | None = await asyncio.to_thread(self._get_current_dep_hashes, get_time, get_hash)
+        self._found_built = False
+        start: float = time.monotonic()
+        await self.execute_async()
+        if not self._found_built: # Only the time of actually creating the target is useful for estimating future builds
+            self._get_durations()[self._target_id] = time.monotonic() - start
+        self._record_dep_hashes(hashes)
+
+    def _get_dep_hashes(self) -> dict[str, dict[str, str]]:
+        """
+        Returns a reference to the dependency hashes dictionary from the persistant global database.
+        It maps each target to the content hashes of it's dependencies, as they were when it was last created.
+        """
+        return get_db().dep_hashes
+
+    def _get_dep_hash_times(self) -> dict[str, int]:
+        """
+        Returns a reference to the dependency hash times dictionary from the persistant global database.
+        It maps each target to it's time right after it was created, when the hashes of it's dependencies were recorded.
+        """
+        return get_db().dep_hash_times
+
+    def _get_current_dep_hashes(
+        self,
+        get_time: Callable[[Node], int | None],
+        get_hash: Callable[[FileNode], str | None],
+    ) -> dict[str, str] | None:
+        """
+        Returns the content hashes of the dependencies, or None if they cannot all be hashed (only rules which depend on files alone can be checked by content).
+        Dependencies older than the target was when the hashes were last recorded did not change since, so their recorded hashes are reused rather than hashing them.
+        """
+        files: list[FileNode] = [dep for dep in self.depends_on if isinstance(dep, FileNode)]
+        if len(files) < len(self.depends_on):
+            return None
+        saved: dict[str, str] = self._get_dep_hashes().get(self._target_id, dict())
+        saved_time: int | None = self._get_dep_hash_times().get(self._target_id)
+        hashes: dict[str, str] = dict()
+        for dep, dep_id in zip(files, self._dep_ids):
+            dep_time: int | None = get_time(dep)
+            digest: str | None
+            if saved_time is not None and dep_time is not None and dep_time < saved_time and dep_id in saved:
+                digest = saved[dep_id]
+            else:
+                digest = get_hash(dep)
+            if digest is None:
+                return None
+            hashes[dep_id] = digest
+        return hashes
+
+    def _record_dep_hashes(self, hashes: dict[str, str] | None) -> None:
+        """Should be called after the target was created, with the hashes of the dependencies taken before creating it"""
+        target_time: int | None = self.target.get_time()
+        if hashes is None or target_time is None:
+            self._get_dep_hashes().pop(self._target_id, None)
+            self._get_dep_hash_times().pop(self._target_id, None)
+            return
+        self._get_dep_hashes()[self._target_id] = hashes
+        self._get_dep_hash_times()[self._target_id] = target_time
+
+    def _deps_unchanged(
+        self,
+        target_time: int,
+        get_time: Callable[[Node], int | None],
+        get_hash: Callable[[FileNode], str | None],
+    ) -> bool:
+        """
+        Whether the contents of all dependencies are the same as when the target was last created.
+        The hashes are only trusted if the target was not recreated since (e.g. outside of this build system, from other contents).
+        """
+        saved: dict[str, str] | None = self._get_dep_hashes().get(self._target_id)
+        if saved is None or self._get_dep_hash_times().get(self._target_id) != target_time:
             return False
-        dep_times: list[float | None] = [dep.get_time() for dep in self.depends_on]
-        return all([isinstance(t, float) and t < res for t in dep_times])
+        return self._get_current_dep_hashes(get_time, get_hash) == saved
 
+    def is_up_to_date(
+        self,
+        get_time: Callable[[Node], int | None] = lambda node: node.get_time(),
+        get_hash: Callable[[FileNode], str | None] = lambda node: node.get_hash(),
+    ) -> bool:
+        """
+        'get_time' and 'get_hash' can be specified to override how the times and hashes of the target and dependencies are obtained (e.g. from a cache)
+
+        A target older than it's dependencies is still up to date if their contents did not change (e.g. they were only touched).
+        """
+        if self._is_newer_than_deps(get_time):
+            return True
+        res: int | None = get_time(self.target)
+        return res is not None and self._deps_unchanged(res, get_time, get_hash)
+
+    def _is_newer_than_deps(self, get_time: Callable[[Node], int | None]) -> bool:
+        """Whether the target exists and is newer than all of it's dependencies, which only takes their times (unlike checking their contents)"""
+        res: int | None = get_time(self.target)
+        if res is None:
+            return False
+        # Stops at the first dependency which is missing or newer than the target:
+        for dep in self.depends_on:
+            t: int | None = get_time(dep)
+            if t is None or t >= res:
+                return False
+        return True
+
+@mypyc_attr(allow_interpreted_subclasses=True)
 class CreationRule(Rule):
-    pass
+    __slots__ = ()
 
+@mypyc_attr(allow_interpreted_subclasses=True)
 class ModificationRule(Rule):
     """
     A modify rule builds a dynamic node by making a modification to it from it's clean state.
@@ -222,105 +523,244 @@ class ModificationRule(Rule):
     When requested to execute, a modify rule will check if the target is built - and if so - do nothing.
     Otherwise, if the target is dirty - it will clean the target.
     Next, the modification will be executed.
+
+    Subclasses implement '_get_build_state', which returns the state along with the content hash of the target if it computed one,
+    and '_do_modification', which is given that hash (or None) so the target does not have to be hashed again.
+    Note: these used to return only the state and take no arguments, subclasses overriding them should be updated.
     """
+    __slots__ = ()
 
-    @abstractmethod
-    def _get_build_state(self) -> BuildState:
-        pass
+    def _get_build_state(self) -> tuple[BuildState, str | None]:
+        """Returns the state of the target, and it's content hash if it was computed to find the state (None otherwise)"""
+        raise NotImplementedError
 
-    @abstractmethod
-    def _do_modification(self) -> None:
-        pass
+    def _do_modification(self, content_hash: str | None) -> None:
+        """Should only be called in the clean state. content_hash: The hash of the target if it is already known, or None."""
+        raise NotImplementedError
 
     def execute(self) -> None:
-        state = self._get_build_state()
+        state, content_hash = self._get_build_state()
         if state is BuildState.BUILT:
+            self._found_built = True
             return
         if state is BuildState.DIRTY:
             self.target.clean()
-        self._do_modification()
+            content_hash = None # The content was restored by cleaning
+        self._do_modification(content_hash)
 
 def get_md5sum(path: str) -> str:
-    return hashlib.md5(open(path, 'rb').read()).hexdigest()
-
+    """The file is hashed as it is read, rather than read entirely into memory first"""
+    with open(path, 'rb', buffering=0) as f:
+        if sys.version_info >= (3, 11):
+            return hashlib.file_digest(f, 'md5').hexdigest()
+        hasher = hashlib.md5()
+        while chunk := f.read(1 << 20):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+@mypyc_attr(allow_interpreted_subclasses=True)
 class FileModifyRule(ModificationRule):
-    def __init__(self, target: FileModificationNode, depends_on: list[Node]):
+    __slots__ = ('modification',)
+
+    def __init__(self, target: FileModificationNode, depends_on: list[Node]) -> None:
         super().__init__(target, depends_on)
-        self.target: FileModificationNode = target
-
-    def _get_modified_hashes(self) -> dict[str, str]:
-        db = get_db().data
-        if "modified_hashes" not in db.keys():
-            db["modified_hashes"] = dict()
-        return db["modified_hashes"] # typing: ignore
-
-    def _get_build_state(self) -> BuildState:
-        # If file hash matches the hash stored after modification - the target is built:
-        actual_hash: str = get_md5sum(self.target.modified_file.path)
-        modified_hashes: dict[str, str] = self._get_modified_hashes()
-        if self.target.get_id() in modified_hashes.keys():
-            saved_hash: str = modified_hashes[self.target.get_id()]
-            if actual_hash == saved_hash:
-                return BuildState.BUILT
+        self.modification: FileModificationNode = target # The target, with it's more specific type
+
+    def _get_modified_hashes(self) -> dict[str, list[int | str] | str]:
+        """
+        Returns a reference to the modified hashes dictionary from the persistant global database.
+        It maps each modification to the modification time, size and md5sum of the modified file, as they were right after it was modified.
+        Databases written by older versions only have the md5sum (as a string).
+        """
+        return get_db().modified_hashes
 
-        # If the clone does not exist or file matches it's clone - we are in the clean state:
-        clone_path: str | None = self.target.get_clone_file_path()
-        if clone_path is None or filecmp.cmp(self.target.modified_file.path, clone_path, shallow=False):
-            return BuildState.CLEAN
+    def execute(self) -> None:
+        # Different modifications of the same file may be executed concurrently, but their cloning and modifying should not interleave:
+        with get_file_lock(self.modification.modified_file.get_id()):
+            super().execute()
+
+    def _get_build_state(self) -> tuple[BuildState, str | None]:
+        # If file hash matches the hash stored after modification - the target is built.
+        # The file is not hashed at all if it's time and size did not change since then, as it was most likely not touched:
+        path: str = self.modification.modified_file.path
+        modified_hashes: dict[str, list[int | str] | str] = self._get_modified_hashes()
+        saved: list[int | str] | str | None = modified_hashes.get(self.modification.get_id())
+        actual_hash: str | None = None
+        if saved is not None:
+            st: os.stat_result = os.stat(path)
+            saved_hash: int | str
+            if isinstance(saved, list) and len(saved) == 3:
+                if saved[:2] == [st.st_mtime_ns, st.st_size]:
+                    return BuildState.BUILT, None
+                saved_hash = saved[2]
+            else:
+                saved_hash = saved if isinstance(saved, str) else "" # An entry of an older version (only the md5sum), or an invalid one
+            actual_hash = get_md5sum(path)
+            if actual_hash == saved_hash:
+                # Stored in the current form, so the file is not hashed again while it is not touched:
+                modified_hashes[self.modification.get_id()] = [st.st_mtime_ns, st.st_size, actual_hash]
+                return BuildState.BUILT, actual_hash
+
+        # If the clone does not exist or file matches it's clone (by the hash stored when cloning) - we are in the clean state:
+        clone_hash: str | None = self.modification.get_clone_hash()
+        if clone_hash is None:
+            return BuildState.CLEAN, actual_hash
+        if actual_hash is None:
+            actual_hash = get_md5sum(path)
+        if actual_hash == clone_hash:
+            return BuildState.CLEAN, actual_hash
         
         # Otherwise - we are in the dirty state:
-        return BuildState.DIRTY
+        return BuildState.DIRTY, actual_hash
     
-    def _do_modification(self) -> None:
-        # Ensure the target is in a clean state:
-        assert self._get_build_state() == BuildState.CLEAN
+    def _do_modification(self, content_hash: str | None) -> None:
+        # The target is not verified to be in a clean state once more, since 'execute' already found (or made) it so.
 
-        # Create a clone if it does not exist:
-        if self.target.get_clone_file_path() is None:
-            self.target.create_clone_file()
+        # Create a clone if it does not exist (in the clean state, the file's hash is that of the clone):
+        if self.modification.get_clone_file_path() is None:
+            self.modification.create_clone_file(content_hash)
 
         # Apply the actual modification:
         self._file_modification()
 
         # Update the modified hashes database:
-        modified_hashes: dict[str, str] = self._get_modified_hashes()
-        modified_hashes[self.target.get_id()] = get_md5sum(self.target.modified_file.path)
+        path: str = self.modification.modified_file.path
+        st: os.stat_result = os.stat(path)
+        modified_hashes: dict[str, list[int | str] | str] = self._get_modified_hashes()
+        modified_hashes[self.modification.get_id()] = [st.st_mtime_ns, st.st_size, get_md5sum(path)]
 
-    @abstractmethod
-    def _file_modification(self):
+    def _file_modification(self) -> None:
         """
         This is the only method that should be overriden by implementations of this class.
         It should include only the core modification of the target file, excluding any management of the modifications such as cloning or restoring the file.
         """
-        pass
+        raise NotImplementedError
+
+# Characters with a special meaning to the shell, which shlex does not interpret the same way:
+_SHELL_SYNTAX: Final = frozenset("|&;<>()$`\\*?[]{}#~!\n")
+# Commands implemented by the shell itself, or differently from the program of the same name (e.g. 'echo' escapes):
+_SHELL_BUILTINS: Final = frozenset({
+    ".", ":", "alias", "break", "cd", "command", "continue", "echo", "eval", "exec", "exit", "export", "printf", "read", "readonly",
+    "return", "set", "shift", "source", "test", "[", "times", "trap", "type", "ulimit", "umask", "unalias", "unset", "wait",
+    "if", "then", "else", "elif", "fi", "for", "while", "until", "do", "done", "case", "esac", "function",
+})
+
+def split_simple_command(cmd_line: str) -> list[str] | None:
+    """
+    Returns the arguments of a command line which can be executed directly, without starting a shell for it,
+    or None if it relies on the shell in any way (shell syntax, builtins or variable assignments).
+    """
+    if not _SHELL_SYNTAX.isdisjoint(cmd_line):
+        return None
+    try:
+        argv: list[str] = shlex.split(cmd_line)
+    except ValueError: # Unbalanced quotes, the shell would report it
+        return None
+    if not argv or "=" in argv[0] or argv[0] in _SHELL_BUILTINS:
+        return None
+    return argv
 
+@mypyc_attr(allow_interpreted_subclasses=True)
 class ShellFileModifyRule(FileModifyRule):
     """
     A rule targeting a modification node, which modifies a file by running a shell command.
     """
-    def __init__(self, target: FileModificationNode, depends_on: list[Node], modification_cmd: str):
+    __slots__ = ('modification_cmd',)
+
+    def __init__(self, target: FileModificationNode, depends_on: list[Node], modification_cmd: str) -> None:
         """
         modification_cmd: The shell command line which will apply the wanted modification to the file targeted by the modification.
         """
         super().__init__(target, depends_on)
         self.modification_cmd = modification_cmd
 
-    def _file_modification(self):
-        os.system(self.modification_cmd)
+    def _file_modification(self) -> None:
+        argv: list[str] | None = split_simple_command(self.modification_cmd)
+        try:
+            returncode: int = subprocess.run(self.modification_cmd if argv is None else argv, shell=argv is None).returncode
+        except OSError as e:
+            raise RuntimeError(f"Command '{self.modification_cmd}' could not be executed, while modifying '{self.modification.modified_file.path}'") from e
+        if returncode != 0:
+            raise RuntimeError(f"Command '{self.modification_cmd}' failed, while modifying '{self.modification.modified_file.path}'")
+
+@mypyc_attr(allow_interpreted_subclasses=True)
+class PythonFileModifyRule(FileModifyRule):
+    """
+    A rule targeting a modification node, which modifies a file by calling a python function.
+    This avoids starting any process, when the modification is simple (e.g. appending to the file).
+    """
+    __slots__ = ('modifier',)
+
+    def __init__(self, target: FileModificationNode, depends_on: list[Node], modifier: Callable[[str], None]) -> None:
+        """
+        modifier: Called with the path of the file targeted by the modification, and should apply the wanted modification to it.
+        """
+        super().__init__(target, depends_on)
+        self.modifier: Callable[[str], None] = modifier
 
+    def _file_modification(self) -> None:
+        self.modifier(self.modification.modified_file.path)
+
+@mypyc_attr(allow_interpreted_subclasses=True)
 class ShellRule(CreationRule):
-    cmd: str
+    __slots__ = ('cmd',)
+    cmd: list[str] | str
 
-    def __init__(self, target: DynamicNode, deps: list[Node], cmd: str):
+    def __init__(self, target: DynamicNode, deps: list[Node], cmd: list[str] | str) -> None:
+        """
+        cmd: Either an argument list which is executed directly, or a command line which is executed by the shell.
+             Command lines which do not rely on the shell (see 'split_simple_command') are executed directly as well.
+        """
         super().__init__(target, deps)
         self.cmd = cmd
 
+    def get_cmd_line(self) -> str:
+        """The command as it would be written in a shell"""
+        return self.cmd if isinstance(self.cmd, str) else shlex.join(self.cmd)
+
+    def get_argv(self) -> list[str] | None:
+        """The arguments of the command if it can be executed directly, or None if it should be executed by the shell"""
+        return split_simple_command(self.cmd) if isinstance(self.cmd, str) else self.cmd
+
     def execute(self) -> None:
-        print(self.cmd)
-        if os.system(self.cmd) != 0:
-            raise RuntimeError(f"Command '{self.cmd}' failed, while building target '{self.target.get_id()}'")
+        cmd_line, argv = self._prepare_command()
+        try:
+            returncode: int = subprocess.run(cmd_line if argv is None else argv, shell=argv is None).returncode
+        except OSError as e:
+            raise self._execution_error(cmd_line) from e
+        self._check_result(cmd_line, returncode)
+
+    async def execute_async(self) -> None:
+        """Same as 'execute', but waits for the command without blocking the build system, which can meanwhile start other rules"""
+        cmd_line, argv = self._prepare_command()
+        try:
+            if argv is None:
+                process: asyncio.subprocess.Process = await asyncio.create_subprocess_shell(cmd_line)
+            else:
+                process = await asyncio.create_subprocess_exec(*argv)
+        except OSError as e:
+            raise self._execution_error(cmd_line) from e
+        self._check_result(cmd_line, await process.wait())
+
+    # Shared by 'execute' and 'execute_async':
+
+    def _prepare_command(self) -> tuple[str, list[str] | None]:
+        """Prints the command line, and returns it along with the arguments to execute it directly (None if it should be executed by the shell)"""
+        cmd_line: str = self.get_cmd_line()
+        print(cmd_line)
+        return cmd_line, self.get_argv()
 
+    def _execution_error(self, cmd_line: str) -> RuntimeError:
+        return RuntimeError(f"Command '{cmd_line}' could not be executed, while building target '{self._target_id}'")
+
+    def _check_result(self, cmd_line: str, returncode: int) -> None:
+        if returncode != 0:
+            raise RuntimeError(f"Command '{cmd_line}' failed, while building target '{self._target_id}'")
+
+@mypyc_attr(allow_interpreted_subclasses=True)
 class CompileRule(ShellRule):
+    __slots__ = ('source_files', 'other_dependencies', 'compiler', 'flags', '_source_count')
+
     def __init__(
             self,
             target: CreatedFileNode,
@@ -328,77 +768,226 @@ class CompileRule(ShellRule):
             other_dependencies: list[Node] = [],
             compiler: str = "cc",
             flags: list[str] = []
-        ):
+        ) -> None:
         super().__init__(
             target,
-            list(source_files+other_dependencies), # For stupid mypy linter
-            f"{compiler} {' '.join(flags)} {' '.join([n.path for n in source_files])} -o {target.path}"
+            [*source_files, *other_dependencies],
+            [compiler, *flags, *(n.path for n in source_files), "-o", target.path]
         )
+        # Kept for emitting the rule as a command template (see BuildSystem.emit_ninja):
+        self.source_files: list[FileNode] = list(source_files)
+        self.other_dependencies: list[Node] = list(other_dependencies)
+        self.compiler: str = compiler
+        self.flags: list[str] = list(flags)
+        # The ids of the (unique) source files are listed first in '_dep_ids', followed by those of the other dependencies:
+        self._source_count: int = len({n.get_id() for n in source_files})
+
+def _ninja_escape(text: str) -> str:
+    """Escape text to be used as the value of a Ninja variable"""
+    return text.replace("$", "$$")
+
+def _ninja_escape_path(path: str) -> str:
+    """Escape a path to be used in a Ninja build statement"""
+    return _ninja_escape(path).replace(" ", "$ ").replace(":", "$:")
 
-@dataclass
 class BuildSystem:
-    def __init__(self, rules: list[CreationRule], skip_verification: bool = False):
+    def __init__(self, rules: list[Rule], skip_verification: bool = False) -> None:
         """
         The set of nodes is infered from the rules.
 
         Normally the following static properties of the build system are verified:
             1. All static nodes exist.
             2. Each dynamic node has a rule for creating it.
-            3. There are no dependency loops.
         This can be disabled by setting 'skip_verification'.
+
+        The order in which nodes are built is computed once here, which also verifies there are no dependency loops.
         """
         
-        self.rules: dict[str, CreationRule] = dict()
-        self.nodes: dict[str, Node] = dict()
-
-        # NOTE: node_requesters is currently dead code, but when adding multiprocessing in the future,
-        #    node_requesters will be needed to notify that it's requester nodes might be ready to be created.
-        self.node_requesters: dict[str, list[str]] = dict() # The key is the node id, and the list is nodes (ids) which depend on it.
+        self.rules: Final[dict[str, Rule]] = dict()
+        self.nodes: Final[dict[str, Node]] = dict()
+
+        # node_requesters is used when building, to notify requester nodes that they might be ready to be created.
+        self.node_requesters: Final[dict[str, list[str]]] = dict() # The key is the node id, and the list is nodes (ids) which depend on it.
+
+        # Node times are cached during a build, since the same node is checked by each of it's requesters.
+        self._mtime_cache: dict[str, int | None] = dict()
+        # Hashes of files are cached as well, along with the time of the file when it was hashed (so it is not hashed again unless it changed):
+        self._hash_cache: dict[str, tuple[int | None, str | None]] = dict()
+
+        # Each node is also given a number (in order of addition), so traversing and scheduling can use lists indexed by number
+        # instead of dictionaries keyed by id. The ids are only used to find the numbers of the starting nodes, and for error messages.
+        self._index: dict[str, int] = dict() # Maps each node id to it's number
+        self._ids: list[str] = []
+        self._node_list: list[Node] = []
+        self._rule_list: list[Rule | None] = [] # The rule creating each node, None for nodes without rules
+        self._dep_indices: list[list[int]] = [] # The numbers of the dependencies of each node
+        self._requester_indices: list[list[int]] = [] # The numbers of the nodes depending on each node
 
         for r in rules:
             # Add to rules:
-            tgt_id = r.target.get_id()
-            if tgt_id in self.rules.keys():
+            tgt_id = r._target_id
+            if tgt_id in self.rules:
                 raise ValueError(f"Got multiple rules with target: '{tgt_id}'")
             self.rules[tgt_id] = r
             
-            # Add to nodes:
-            for node in [r.target] + r.depends_on:
-                ident: str = node.get_id()
-                if ident not in self.nodes.keys():
-                    self.nodes[ident] = node
-                    self.node_requesters[ident] = []
- 
-        # Fill node_requesters:
-        for r in rules:
-            for node in r.depends_on:
-                self.node_requesters[node.get_id()].append(r.target.get_id())
+            # Add to nodes, and fill node_requesters (in the same pass, since only the nodes of this rule are needed):
+            for node, ident in zip([r.target] + r.depends_on, [tgt_id] + r._dep_ids):
+                if ident not in self.nodes:
+                    self._add_node(node, ident)
+            self._add_dependencies(r)
 
         # Perform static verification, if needed
         if not skip_verification:
             self._run_static_checks()
 
-    def build(self, target: DynamicNode | None = None) -> None:
-        start_nodes: list[Node] = self._all_or_one(target)
+        self._topo_order: list[int] = self._compute_topo_order() # Node numbers, each appears after all of it's dependencies
+        self._n2i: list[int] = [0] * len(self._ids) # The index of each node (by number) in _topo_order
+        for position, index in enumerate(self._topo_order):
+            self._n2i[index] = position
 
-        def execute_rule(node: Node) -> None:
-            if isinstance(node, DynamicNode):
-                rule: CreationRule = self._find_rule(node)
-                if not rule.is_up_to_date():
-                    rule.execute()
+        # The build order of each target which was built or cleaned, since it only changes when rules are added:
+        self._required_orders: dict[str, list[int]] = dict()
+
+    def add_rule(self, rule: Rule) -> None:
+        """
+        Add a rule to the build system after it was constructed.
+        The build order is updated incrementally (Pearce-Kelly), only reordering nodes which are ordered between the ends of a new dependency.
+
+        Static nodes new to the build system are verified to exist, dynamic dependencies may get their rules in later calls.
+        If the rule would create a dependency loop, an error is raised and the rule is not added.
+        """
+        tgt_id: str = rule._target_id
+        if tgt_id in self.rules:
+            raise ValueError(f"Got multiple rules with target: '{tgt_id}'")
+        self._required_orders.clear()
+        new_nodes: dict[str, Node] = dict()
+        for node, ident in zip([rule.target] + rule.depends_on, [tgt_id] + rule._dep_ids):
+            if ident not in self.nodes and ident not in new_nodes:
+                if isinstance(node, StaticNode):
+                    node.verify_exists()
+                new_nodes[ident] = node
+
+        # New nodes have no dependencies yet, so they can be placed last:
+        node_count: int = len(self._ids) # New nodes are numbered from here
+        for ident, node in new_nodes.items():
+            self._add_node(node, ident)
+            self._n2i.append(len(self._topo_order))
+            self._topo_order.append(self._index[ident])
+        self.rules[tgt_id] = rule
+        self._add_dependencies(rule)
+
+        tgt_index: int = self._index[tgt_id]
+        try:
+            for dep_index in self._dep_indices[tgt_index]:
+                self._reorder_for_dependency(dep_index, tgt_index)
+        except RuntimeError:
+            # Any topological order of the graph with the new dependencies is also valid without them:
+            for dep_id, dep_index in zip(rule._dep_ids, self._dep_indices[tgt_index]):
+                self.node_requesters[dep_id].remove(tgt_id)
+                self._requester_indices[dep_index].remove(tgt_index)
+            del self.rules[tgt_id]
+            self._rule_list[tgt_index] = None
+            self._dep_indices[tgt_index] = []
+            for ident in new_nodes:
+                del self.nodes[ident]
+                del self.node_requesters[ident]
+                del self._index[ident]
+            del self._ids[node_count:]
+            del self._node_list[node_count:]
+            del self._rule_list[node_count:]
+            del self._dep_indices[node_count:]
+            del self._requester_indices[node_count:]
+            self._topo_order = [index for index in self._topo_order if index < node_count]
+            self._n2i = [0] * node_count
+            for position, index in enumerate(self._topo_order):
+                self._n2i[index] = position
+            raise
+
+    def build(self, target: DynamicNode | None = None, jobs: int | None = None) -> None:
+        """
+        Rules are scheduled as soon as all of their dependencies are created (Kahn's algorithm),
+        and up to 'jobs' independent rules (defaults to the number of CPUs) are executed concurrently, as asyncio tasks.
+
+        Among the rules which are ready, the ones heading the longest chain of rules (critical path)
+        are executed first, estimated by the durations of previous executions.
+
+        If none of the required nodes changed since the last time this target was built, no rule is checked at all.
+        """
+        if jobs is None:
+            jobs = os.cpu_count() or 1
+        elif jobs < 1:
+            raise ValueError(f"Expected a positive number of jobs, got {jobs}")
+        asyncio.run(self._build_async(target, jobs))
 
-        self.traverse_dag(start_nodes, postorder_action=execute_rule)
-        
     def clean(self, target: DynamicNode | None = None) -> None:
         """Specify None to clean all dynamic nodes, or a target to clean it and anything it (recursively) depends on."""
         
-        def clean_node(node: Node) -> None:
+        for index in self._required_order(target):
+            node: Node = self._node_list[index]
             if isinstance(node, DynamicNode):
                 node.clean()
-        self.traverse_dag(self._all_or_one(target), postorder_action=clean_node)
 
+        # Times cached during the last build would be stale:
+        self._mtime_cache.clear()
         get_db().clean()
         
+    def emit_ninja(self, path: str = NINJA_FILENAME) -> None:
+        """
+        Write the build system as a Ninja build file, so it can be built by Ninja's scheduler.
+        Only shell rules between file nodes can be expressed, otherwise a ValueError is raised.
+
+        Compile rules sharing a compiler share a command template: their source files are the inputs and their other dependencies are implicit inputs.
+        """
+        templates: dict[str, str] = dict() # Maps each command template to the name of it's Ninja rule
+        builds: list[str] = []
+        for index in self._topo_order:
+            rule: Rule | None = self._rule_list[index]
+            if rule is None:
+                continue
+            ident: str = self._ids[index]
+            if not isinstance(rule, ShellRule) or not all(isinstance(n, FileNode) for n in [rule.target] + rule.depends_on):
+                raise ValueError(f"The rule for '{ident}' cannot be expressed in Ninja, since it is not a shell rule between files")
+
+            variables: dict[str, str]
+            if isinstance(rule, CompileRule):
+                template: str = f"{_ninja_escape(shlex.quote(rule.compiler))} $flags $in -o $out"
+                input_ids: list[str] = rule._dep_ids[:rule._source_count]
+                implicit_ids: list[str] = rule._dep_ids[rule._source_count:]
+                variables = {"flags": shlex.join(rule.flags)}
+            else:
+                template = "$cmd"
+                input_ids = rule._dep_ids
+                implicit_ids = []
+                variables = {"cmd": rule.get_cmd_line()}
+            if template not in templates:
+                templates[template] = "shell" if template == "$cmd" else f"compile_{len(templates)}"
+
+            statement: str = f"build {_ninja_escape_path(ident)}: {templates[template]}"
+            statement += "".join(f" {_ninja_escape_path(dep_id)}" for dep_id in input_ids)
+            if implicit_ids:
+                statement += " |" + "".join(f" {_ninja_escape_path(dep_id)}" for dep_id in implicit_ids)
+            builds.append(statement + "".join(f"\n  {name} = {_ninja_escape(value)}" for name, value in variables.items()))
+
+        with open(path, 'w') as f:
+            for template, name in templates.items():
+                f.write(f"rule {name}\n  command = {template}\n\n")
+            f.write("\n\n".join(builds) + "\n")
+
+    def build_with_ninja(self, target: DynamicNode | None = None, jobs: int | None = None, path: str = NINJA_FILENAME) -> None:
+        """Emit a Ninja build file (see 'emit_ninja') and build the target (all if None) by running Ninja, which should be installed"""
+        self.emit_ninja(path)
+        cmd: list[str] = ["ninja", "-f", path]
+        if jobs is not None:
+            cmd += ["-j", str(jobs)]
+        if target is not None:
+            cmd.append(target.get_id())
+        try:
+            returncode: int = subprocess.run(cmd).returncode
+        except OSError as e:
+            raise RuntimeError(f"Command '{shlex.join(cmd)}' could not be executed, is Ninja installed?") from e
+        if returncode != 0:
+            raise RuntimeError(f"Command '{shlex.join(cmd)}' failed")
+
     def dag(self, target: Node | None = None) -> None:
         """Print the nodes/dependencies DAG"""
         depth: int = 0
@@ -426,14 +1015,76 @@ class BuildSystem:
 
         A set of traversed nodes is returned.
         """
-        traversed_nodes: set[str] = set()
-        for start in starting_nodes:
-            if start.get_id() not in traversed_nodes:
-                self._traverse_dag_aux(start, set(), traversed_nodes, preorder_action, postorder_action)
-        return traversed_nodes
+        postorder: list[int] = self._traverse([self._index_of(node) for node in starting_nodes], preorder_action, postorder_action)
+        return {self._ids[index] for index in postorder}
     
     # 'Private' methods: ======================================
 
+    def _add_node(self, node: Node, ident: str) -> None:
+        self.nodes[ident] = node
+        self.node_requesters[ident] = []
+        self._index[ident] = len(self._ids)
+        self._ids.append(ident)
+        self._node_list.append(node)
+        self._rule_list.append(None)
+        self._dep_indices.append([])
+        self._requester_indices.append([])
+
+    def _add_dependencies(self, rule: Rule) -> None:
+        """Record the rule of it's target and the dependencies on it's target, all nodes of the rule should already be added"""
+        tgt_index: int = self._index[rule._target_id]
+        self._rule_list[tgt_index] = rule
+        self._dep_indices[tgt_index] = [self._index[dep_id] for dep_id in rule._dep_ids]
+        for dep_id, dep_index in zip(rule._dep_ids, self._dep_indices[tgt_index]):
+            self.node_requesters[dep_id].append(rule._target_id)
+            self._requester_indices[dep_index].append(tgt_index)
+
+    def _index_of(self, node: Node) -> int:
+        ident: str = node.get_id()
+        if ident not in self._index:
+            raise RuntimeError(f"The node '{ident}' is not part of the build system")
+        return self._index[ident]
+
+    def _traverse(
+        self,
+        starting_indices: list[int],
+        preorder_action: Callable[[Node], None] = lambda _: None,
+        postorder_action: Callable[[Node], None] = lambda _: None,
+    ) -> list[int]:
+        """Implements 'traverse_dag' by node numbers. Returns the numbers of the traversed nodes in postorder, which is also a valid build order."""
+        # A byte per node marks whether it was already seen. The marks are used both to find circular dependency loops
+        # (reaching a node on the stack) and to avoid the addition of the same node multiple times.
+        ON_STACK, DONE = 1, 2
+        color: bytearray = bytearray(len(self._ids))
+        stack: list[tuple[int, Iterator[int]]] = [] # Explicit stack of node numbers, each with it's yet unvisited dependencies
+        postorder: list[int] = []
+
+        def push(index: int) -> None:
+            color[index] = ON_STACK
+            node: Node = self._node_list[index]
+            preorder_action(node)
+            if node._is_dynamic and self._rule_list[index] is None:
+                self._find_rule(node) # Raises an error
+            stack.append((index, iter(self._dep_indices[index])))
+
+        for start in starting_indices:
+            if not color[start]:
+                push(start)
+            while stack:
+                index, dep_indices = stack[-1]
+                dep_index: int = next(dep_indices, -1)
+                if dep_index < 0:
+                    stack.pop()
+                    color[index] = DONE
+                    postorder.append(index)
+                    postorder_action(self._node_list[index])
+                elif not color[dep_index]:
+                    push(dep_index)
+                elif color[dep_index] == ON_STACK:
+                    chain: list[int] = [i for i, _ in stack] + [dep_index]
+                    raise RuntimeError(f"Found a circular dependency chain: " + ', '.join(self._ids[i] for i in chain))
+        return postorder
+
     def _run_static_checks(self) -> None:
         """See documentation in __init__"""
         for node in self.nodes.values():
@@ -444,59 +1095,225 @@ class BuildSystem:
                 assert isinstance(node, DynamicNode)
                 # 2.
                 self._find_rule(node)
-        # 3.
-        self.traverse_dag(list(self.nodes.values()))
 
-    def _find_rule(self, target: DynamicNode) -> CreationRule:
+    def _compute_topo_order(self) -> list[int]:
+        """Kahn's algorithm: a node is added once all of it's dependencies were added"""
+        indegree: list[int] = [len(dep_indices) for dep_indices in self._dep_indices]
+        queue: deque[int] = deque(index for index, count in enumerate(indegree) if count == 0)
+        order: list[int] = []
+        while queue:
+            index: int = queue.popleft()
+            order.append(index)
+            for requester in self._requester_indices[index]:
+                indegree[requester] -= 1
+                if indegree[requester] == 0:
+                    queue.append(requester)
+
+        if len(order) < len(self._ids):
+            # Traversing from the nodes which were left out raises an error describing the circular dependency:
+            self._traverse([index for index, count in enumerate(indegree) if count > 0])
+            raise RuntimeError("Found a circular dependency chain")
+        return order
+
+    def _reorder_for_dependency(self, dep_index: int, tgt_index: int) -> None:
+        """
+        Restore the build order after the node numbered 'tgt_index' started depending on 'dep_index' (Pearce-Kelly).
+        '_requester_indices' should already include the new dependency.
+        """
+        lower: int = self._n2i[tgt_index]
+        upper: int = self._n2i[dep_index]
+        if upper < lower:
+            return # The order is still valid
+
+        # Forward search: nodes (recursively) requesting the target which are ordered before the dependency.
+        forward: list[int] = []
+        parents: dict[int, int] = {tgt_index: tgt_index}
+        stack: list[int] = [tgt_index]
+        while stack:
+            index: int = stack.pop()
+            forward.append(index)
+            for requester in self._requester_indices[index]:
+                if requester == dep_index:
+                    chain: list[int] = [dep_index, index]
+                    while chain[-1] != tgt_index:
+                        chain.append(parents[chain[-1]])
+                    if tgt_index != dep_index:
+                        chain.append(dep_index)
+                    raise RuntimeError(f"Found a circular dependency chain: " + ', '.join(self._ids[i] for i in chain))
+                if requester not in parents and self._n2i[requester] < upper:
+                    parents[requester] = index
+                    stack.append(requester)
+
+        # Backward search: nodes the dependency (recursively) depends on which are ordered after the target.
+        backward: list[int] = []
+        visited: set[int] = {dep_index}
+        stack = [dep_index]
+        while stack:
+            index = stack.pop()
+            backward.append(index)
+            for sub_dep_index in self._dep_indices[index]:
+                if sub_dep_index not in visited and self._n2i[sub_dep_index] > lower:
+                    visited.add(sub_dep_index)
+                    stack.append(sub_dep_index)
+
+        # Both sets keep their relative order, and all of 'backward' is moved before all of 'forward':
+        forward.sort(key=self._n2i.__getitem__)
+        backward.sort(key=self._n2i.__getitem__)
+        positions: list[int] = sorted(self._n2i[index] for index in forward + backward)
+        for position, index in zip(positions, backward + forward):
+            self._n2i[index] = position
+            self._topo_order[position] = index
+
+    def _required_order(self, target: Node | None) -> list[int]:
+        """Returns the numbers of the target (all nodes if None) and anything it (recursively) depends on, in build order"""
+        if target is None:
+            return self._topo_order
+        ident: str = target.get_id()
+        if ident not in self._required_orders:
+            self._required_orders[ident] = self._traverse([self._index_of(target)])
+        return self._required_orders[ident]
+
+    def _find_rule(self, target: Node) -> Rule:
         ident = target.get_id()
-        if not ident in self.rules.keys():
+        if ident not in self.rules:
             raise RuntimeError(f"There is no rule for creating the dynamic node '{ident}'")
         return self.rules[ident]
 
-    def _traverse_dag_aux(
-        self,
-        target: Node,
-        node_stack: set[str],
-        traversed_nodes: set[str],
-        preorder_action: Callable[[Node], None],
-        postorder_action: Callable[[Node], None],
-    ) -> None:
-        """
-        'node_stack' is used to find circular dependency loops.
-        'traversed_nodes' is used to avoid the addition of the same node multiple times.
-        """
-        tgt_id = target.get_id()
-        traversed_nodes.add(tgt_id)
-
-        preorder_action(target)
-        if isinstance(target, DynamicNode):
-            rule: CreationRule = self._find_rule(target)
-            for dep in rule.depends_on:
-                dep_id: str = dep.get_id()
-                if dep_id in node_stack:
-                    raise RuntimeError(f"Found a circular dependency chain: " + ', '.join(list(node_stack.union({dep_id}))))
-                if dep_id not in traversed_nodes:
-                    self._traverse_dag_aux(dep, node_stack.union({tgt_id}), traversed_nodes, preorder_action, postorder_action)
-        postorder_action(target)
-
-    def _build_aux(self, target: Node, target_stack: list[str]) -> None:
-        if isinstance(target, StaticNode):
-            target.verify_exists()
+    async def _build_async(self, target: DynamicNode | None, jobs: int) -> None:
+        """See documentation in build"""
+        self._mtime_cache.clear()
+        self._hash_cache.clear()
+        order: list[int] = self._required_order(target)
+
+        snapshot_key: str = "" if target is None else target.get_id() # The empty key stands for all nodes
+        snapshots: dict[str, dict[str, int | None]] = self._get_snapshots()
+        if snapshots.get(snapshot_key) == self._take_snapshot(order):
+            return
+
+        # The rules of the required dynamic nodes, and the number of dynamic dependencies each of them is still waiting for:
+        required_rules: dict[int, Rule] = dict()
+        indegree: list[int] = [0] * len(self._ids)
+        for index in order:
+            if self._node_list[index]._is_dynamic:
+                rule: Rule | None = self._rule_list[index]
+                # Nodes without a rule are only rejected when traversing if the verification was not skipped:
+                required_rules[index] = rule if rule is not None else self._find_rule(self._node_list[index])
+                indegree[index] = sum(1 for dep_index in self._dep_indices[index] if self._node_list[dep_index]._is_dynamic)
+
+        # Rules which were never executed are estimated to take the average duration:
+        durations: dict[int, float | None] = {index: rule.last_duration for index, rule in required_rules.items()}
+        known: list[float] = [d for d in durations.values() if d is not None]
+        default_duration: float = sum(known) / len(known) if known else 1.0
+        critical_path: list[float] = [0.0] * len(self._ids) # Nodes which are not required remain 0
+        for index in reversed(order):
+            if index in required_rules:
+                duration: float | None = durations[index]
+                longest_requester: float = max((critical_path[req] for req in self._requester_indices[index]), default=0.0)
+                critical_path[index] = (default_duration if duration is None else duration) + longest_requester
+
+        ready: list[tuple[float, int]] = [(-critical_path[index], index) for index in required_rules if indegree[index] == 0]
+        heapq.heapify(ready)
+
+        def on_created(index: int) -> None:
+            for requester in self._requester_indices[index]:
+                if requester in required_rules:
+                    indegree[requester] -= 1
+                    if indegree[requester] == 0:
+                        heapq.heappush(ready, (-critical_path[requester], requester))
+
+        # Rules wait in 'ready' (rather than as tasks) until a job is free, so the critical path is prioritized when starting each rule:
+        running: dict[asyncio.Task[None], int] = dict()
+        try:
+            while ready or running:
+                while ready and len(running) < jobs:
+                    _, index = heapq.heappop(ready)
+                    rule = required_rules[index]
+                    # Comparing times is cheap, so it is done right away, rather than taking a job for rules which are up to date:
+                    if rule._is_newer_than_deps(self._get_time):
+                        on_created(index)
+                    else:
+                        running[asyncio.create_task(self._run_rule(rule))] = index
+
+                if running:
+                    done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                    # The failures of all finished rules are retrieved (so asyncio does not report them), and the first one is propagated:
+                    errors: list[BaseException] = []
+                    for task in done:
+                        index = running.pop(task)
+                        error: BaseException | None = task.exception()
+                        if error is not None:
+                            errors.append(error)
+                        else:
+                            self._invalidate_time(self._node_list[index])
+                            on_created(index)
+                    if errors:
+                        raise errors[0]
+        except BaseException:
+            # Rules which are already running are left to finish, even if another rule failed (their failures are dropped).
+            # This is not a 'finally' clause, since with mypyc it re-raises the failure of a previous build after an 'await':
+            if running:
+                await asyncio.wait(running)
+                for task in running:
+                    if not task.cancelled():
+                        task.exception()
+            raise
+
+        # A snapshot with missing nodes would never match, since their rules are always executed:
+        snapshot: dict[str, int | None] = self._take_snapshot(order)
+        if None in snapshot.values():
+            snapshots.pop(snapshot_key, None)
         else:
-            assert isinstance(target, DynamicNode)
-            ident = target.get_id()
-            # Check for circular dependency:
-            if ident in target_stack:
-                raise RuntimeError(f"Found a circular dependency chain: " + ', '.join(target_stack + [ident]))
-            
-            rule: CreationRule = self._find_rule(target)
-            
-            # Ensure all dependencies are up to date:
-            for dep in rule.depends_on:
-                self._build_aux(dep, target_stack + [ident])
+            snapshots[snapshot_key] = snapshot
 
-            if not rule.is_up_to_date():
-                rule.execute()
+    async def _run_rule(self, rule: Rule) -> None:
+        """
+        Execute a rule whose target is older than it's dependencies (or missing), unless the contents of the dependencies did not change.
+        Their contents are checked in a worker thread, since it hashes them.
+        """
+        target_time: int | None = self._get_time(rule.target)
+        if target_time is None or not await asyncio.to_thread(rule._deps_unchanged, target_time, self._get_time, self._get_hash):
+            await rule.timed_execute(self._get_time, self._get_hash)
+
+    def _get_snapshots(self) -> dict[str, dict[str, int | None]]:
+        """
+        Returns a reference to the build snapshots dictionary from the persistant global database.
+        It maps each built target to the times of all the nodes it required, as they were after building it.
+        """
+        return get_db().build_snapshots
+
+    def _take_snapshot(self, indices: list[int]) -> dict[str, int | None]:
+        return {self._ids[index]: self._get_time(self._node_list[index]) for index in indices}
+
+    def _get_time(self, node: Node) -> int | None:
+        """
+        Same as 'node.get_time()', but memoized until the node is invalidated.
+        This is also called from worker threads while nodes are invalidated, so the cache is accessed by single (atomic) operations.
+        """
+        ident: str = node.get_id()
+        try:
+            return self._mtime_cache[ident]
+        except KeyError:
+            node_time: int | None = node.get_time()
+            self._mtime_cache[ident] = node_time
+            return node_time
+
+    def _get_hash(self, node: FileNode) -> str | None:
+        """Same as 'node.get_hash()', but memoized while the time of the node does not change"""
+        ident: str = node.get_id()
+        node_time: int | None = self._get_time(node)
+        cached: tuple[int | None, str | None] | None = self._hash_cache.get(ident)
+        if cached is not None and node_time is not None and cached[0] == node_time:
+            return cached[1]
+        digest: str | None = node.get_hash()
+        self._hash_cache[ident] = (node_time, digest)
+        return digest
+
+    def _invalidate_time(self, node: Node) -> None:
+        """Should be called after a node is (re)created, so it's time would not be taken from the cache"""
+        self._mtime_cache.pop(node.get_id(), None)
+        if isinstance(node, FileModificationNode):
+            # The modified file itself was changed as well:
+            self._mtime_cache.pop(node.modified_file.get_id(), None)
 
     def _all_or_one(self, target: Node | None) -> list[Node]:
         """Returns all nodes if target is None, or just the target otherwise"""
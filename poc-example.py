@@ -2,7 +2,7 @@
 from makeapi import *
 import click
 
-rules: list[CreationRule] = []
+rules: list[Rule] = []
 
 poc_example_src = StaticFileNode("poc-example.c")
 modified_poc_example_src = FileModificationNode(poc_example_src, "poc-example-mod-1")
@@ -11,8 +11,12 @@ modified_poc_example_src = FileModificationNode(poc_example_src, "poc-example-mo
 obj1 = CreatedFileNode("example-dep.o")
 rules += [CompileRule(obj1, [StaticFileNode("example-dep.c")], flags=["-c"])]
 
+def append_stuff(path: str) -> None:
+    with open(path, 'a') as f:
+        f.write("\n//stuff\n")
+
 obj2 = CreatedFileNode("poc-example.o")
-rules += [ShellFileModifyRule(modified_poc_example_src, [], f"echo '\n//stuff\n' >> poc-example.c")]
+rules += [PythonFileModifyRule(modified_poc_example_src, [], append_stuff)]
 rules += [CompileRule(obj2, [poc_example_src], [modified_poc_example_src], flags=["-c"])]
 
 tgt = CreatedFileNode("poc-example-exec")
@@ -25,9 +29,10 @@ def cli():
     pass
 
 @cli.command("build")
-def build():
+@click.option("-j", "--jobs", type=int, default=None, help="Number of rules to execute concurrently.")
+def build(jobs: int | None):
     print(f"Building target...")
-    bs.build(tgt)
+    bs.build(tgt, jobs)
 
 @cli.command("clean")
 def clean():
@@ -0,0 +1,13 @@
+import pytest
+
+import makeapi
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """Each test builds in it's own directory, with it's own database"""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(makeapi, "DATABASE", None)
+    yield tmp_path
+    if makeapi.DATABASE is not None:
+        makeapi.DATABASE.clean() # Also keeps it from being synced at exit
@@ -0,0 +1,61 @@
+"""
+Rules added after the BuildSystem was constructed keep the build order valid, and loops are rejected without changing it.
+"""
+import copy
+import random
+
+import pytest
+
+from makeapi import BuildSystem, CreatedFileNode, ShellRule
+
+
+def make_rule(target: str, deps: list[str]) -> ShellRule:
+    return ShellRule(CreatedFileNode(target), [CreatedFileNode(dep) for dep in deps], f"touch {target}")
+
+
+def assert_valid_order(system: BuildSystem) -> None:
+    order = system._topo_order
+    assert sorted(order) == list(range(len(system._ids)))
+    assert all(system._n2i[index] == position for position, index in enumerate(order))
+    for tgt_id, rule in system.rules.items():
+        for dep_id in rule._dep_ids:
+            assert system._n2i[system._index[dep_id]] < system._n2i[system._index[tgt_id]], f"'{dep_id}' is ordered after '{tgt_id}'"
+
+
+def state_of(system: BuildSystem) -> dict:
+    # Nodes and rules are compared by identity, so only the containers holding them are copied:
+    shallow = ["nodes", "rules", "_node_list", "_rule_list"]
+    deep = ["node_requesters", "_index", "_ids", "_dep_indices", "_requester_indices", "_topo_order", "_n2i"]
+    state = {name: copy.copy(getattr(system, name)) for name in shallow}
+    state.update({name: copy.deepcopy(getattr(system, name)) for name in deep})
+    return state
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_order_is_valid_after_each_added_rule(seed):
+    rng = random.Random(seed)
+    names = [f"n{i}" for i in range(30)]
+    # Every node only depends on nodes before it, and the rules are added in a random order so nodes must be reordered:
+    rules = [make_rule(name, rng.sample(names[:i], rng.randint(0, min(i, 4)))) for i, name in enumerate(names)]
+    rng.shuffle(rules)
+
+    system = BuildSystem(rules[:5], skip_verification=True)
+    assert_valid_order(system)
+    for rule in rules[5:]:
+        system.add_rule(rule)
+        assert_valid_order(system)
+
+
+def test_loop_is_rejected_and_state_is_restored():
+    system = BuildSystem([make_rule("a", ["b"]), make_rule("b", ["c"])], skip_verification=True)
+    before = state_of(system)
+
+    with pytest.raises(RuntimeError, match="Found a circular dependency chain"):
+        system.add_rule(make_rule("c", ["new", "a"]))
+    assert state_of(system) == before
+
+    # The build system is still usable after the rejected rule:
+    system.add_rule(make_rule("c", ["new"]))
+    system.add_rule(make_rule("new", []))
+    assert_valid_order(system)
+    system.build()
@@ -0,0 +1,56 @@
+"""
+Building with the BuildSystem: scheduling of rules, their failures and invalid graphs.
+"""
+import gc
+import os
+
+import pytest
+
+from makeapi import BuildSystem, CreatedFileNode, CreationRule, ShellRule, get_db
+
+
+def test_dynamic_node_without_rule_fails_when_verification_is_skipped():
+    system = BuildSystem([ShellRule(CreatedFileNode("a"), [CreatedFileNode("b")], "cp b a")], skip_verification=True)
+    with pytest.raises(RuntimeError, match="There is no rule for creating the dynamic node 'b'"):
+        system.build()
+
+
+@pytest.mark.parametrize("jobs", [0, -1])
+def test_non_positive_jobs_are_rejected(jobs):
+    system = BuildSystem([ShellRule(CreatedFileNode("a"), [], "touch a")])
+    with pytest.raises(ValueError, match="Expected a positive number of jobs"):
+        system.build(jobs=jobs)
+
+
+def test_every_failure_is_retrieved(caplog):
+    system = BuildSystem([ShellRule(CreatedFileNode(name), [], "false") for name in ("a", "b", "c")])
+    with pytest.raises(RuntimeError, match="Command 'false' failed"):
+        system.build(jobs=3)
+    gc.collect() # Unretrieved exceptions of tasks are logged when the tasks are collected
+    assert "never retrieved" not in caplog.text
+
+
+def test_build_after_failed_build():
+    with pytest.raises(RuntimeError):
+        BuildSystem([ShellRule(CreatedFileNode("a"), [], "false")]).build(jobs=1)
+    BuildSystem([ShellRule(CreatedFileNode("b"), [], "touch b")]).build(jobs=1)
+    assert os.path.exists("b")
+
+
+class RecordingRule(CreationRule):
+    started: list[str] = []
+
+    def execute(self) -> None:
+        RecordingRule.started.append(self.target.get_id())
+        with open(self.target.get_id(), "w"):
+            pass
+
+
+def test_longest_recorded_path_starts_first():
+    y1 = CreatedFileNode("y1")
+    rules = [RecordingRule(y1, []), RecordingRule(CreatedFileNode("y2"), [y1]), RecordingRule(CreatedFileNode("x"), [])]
+    # The chain y1 -> y2 is longer, but x took longer than both of them:
+    get_db().durations.update(y1=1.0, y2=1.0, x=10.0)
+    RecordingRule.started.clear()
+    BuildSystem(rules).build(jobs=1)
+    assert RecordingRule.started == ["x", "y1", "y2"]
@@ -0,0 +1,103 @@
+"""
+Targets older than their dependencies are not rebuilt if the contents of the dependencies did not change.
+"""
+import os
+import shutil
+
+from makeapi import BuildSystem, CreatedFileNode, CreationRule, StaticFileNode
+
+
+class CopyRule(CreationRule):
+    executions: int = 0
+
+    def execute(self) -> None:
+        CopyRule.executions += 1
+        shutil.copy(self.depends_on[0].get_id(), self.target.get_id())
+
+
+def write(path: str, text: str, mtime_ns: int) -> None:
+    with open(path, "w") as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def make_build_system() -> BuildSystem:
+    return BuildSystem([CopyRule(CreatedFileNode("t"), [StaticFileNode("d")])])
+
+
+def test_touched_dependency_does_not_rebuild():
+    write("d", "X", 1_000_000_000)
+    make_build_system().build()
+    executions = CopyRule.executions
+
+    os.utime("d", ns=(5_000_000_000_000_000_000, 5_000_000_000_000_000_000)) # Newer than the target, same content
+    make_build_system().build()
+    assert CopyRule.executions == executions
+
+
+def test_target_recreated_outside_of_the_build_system_is_rebuilt():
+    write("d", "X", 1_000_000_000)
+    make_build_system().build()
+    assert read("t") == "X"
+
+    # The target is recreated from other contents without the build system (e.g. by Ninja, or by hand):
+    write("d", "Y", 2_000_000_000)
+    shutil.copy("d", "t")
+
+    # Reverting the dependency to the contents it had when the build system created the target:
+    write("d", "X", 5_000_000_000_000_000_000)
+    make_build_system().build()
+    assert read("t") == "X"
+
+
+class CountingFileNode(StaticFileNode):
+    hashed: list[str] = []
+
+    def get_hash(self) -> str | None:
+        CountingFileNode.hashed.append(self.path)
+        return super().get_hash()
+
+
+def test_dependency_is_hashed_once_per_build():
+    write("d", "X", 1_000_000_000)
+    d = CountingFileNode("d")
+    BuildSystem([CopyRule(CreatedFileNode("t1"), [d]), CopyRule(CreatedFileNode("t2"), [d])]).build()
+
+    os.utime("d", ns=(5_000_000_000_000_000_000, 5_000_000_000_000_000_000))
+    CountingFileNode.hashed.clear()
+    BuildSystem([CopyRule(CreatedFileNode("t1"), [d]), CopyRule(CreatedFileNode("t2"), [d])]).build()
+    assert CountingFileNode.hashed == ["d"]
+
+
+def test_unchanged_dependencies_are_not_hashed_again():
+    write("d1", "X", 1_000_000_000)
+    write("d2", "X", 1_000_000_000)
+    rules = lambda: [CopyRule(CreatedFileNode("t"), [CountingFileNode("d2"), CountingFileNode("d1")])]
+    BuildSystem(rules()).build()
+
+    write("d2", "Y", 5_000_000_000_000_000_000)
+    CountingFileNode.hashed.clear()
+    BuildSystem(rules()).build()
+    assert read("t") == "Y"
+    assert CountingFileNode.hashed == ["d2"]
+
+
+class EditingCopyRule(CopyRule):
+    """Copies the dependency, which is then edited before the rule finishes (e.g. by the user while the build runs)"""
+    def execute(self) -> None:
+        super().execute()
+        write(self.depends_on[0].get_id(), "Y", 5_000_000_000_000_000_000)
+
+
+def test_dependency_edited_while_the_rule_runs_is_rebuilt():
+    write("d", "X", 1_000_000_000)
+    BuildSystem([EditingCopyRule(CreatedFileNode("t"), [StaticFileNode("d")])]).build()
+    assert read("t") == "X"
+
+    make_build_system().build()
+    assert read("t") == "Y"
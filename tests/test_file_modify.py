@@ -0,0 +1,94 @@
+"""
+Modifications of files are applied once, and the modified files are restored when cleaning.
+"""
+import asyncio
+import os
+
+from makeapi import BuildState, BuildSystem, FileModificationNode, PythonFileModifyRule, StaticFileNode, get_db, get_md5sum
+
+
+def append_b(path: str) -> None:
+    with open(path, "a") as f:
+        f.write("b")
+
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def test_modified_hash_of_older_database_is_still_recognized():
+    with open("f.txt", "w") as f:
+        f.write("a")
+    modification = FileModificationNode(StaticFileNode("f.txt"), "append_b")
+    rule = PythonFileModifyRule(modification, [], append_b)
+    BuildSystem([rule]).build()
+    assert read("f.txt") == "ab"
+
+    # Older versions only stored the md5sum of the modified file:
+    get_db().modified_hashes[modification.get_id()] = get_md5sum("f.txt")
+    assert rule._get_build_state()[0] is BuildState.BUILT
+    assert get_db().modified_hashes[modification.get_id()][2] == get_md5sum("f.txt") # Stored in the current form
+
+
+def test_duration_is_not_recorded_when_already_built():
+    with open("f.txt", "w") as f:
+        f.write("a")
+    modification = FileModificationNode(StaticFileNode("f.txt"), "append_b")
+    rule = PythonFileModifyRule(modification, [], append_b)
+    BuildSystem([rule]).build()
+    assert rule.last_duration is not None
+
+    get_db().durations[modification.get_id()] = 123.0
+    asyncio.run(rule.timed_execute()) # Finds the modification already applied
+    assert read("f.txt") == "ab"
+    assert rule.last_duration == 123.0
+
+
+class LoggedModifyRule(PythonFileModifyRule):
+    """Overrides the extension points of modification rules, with their current signatures"""
+    log: list[BuildState | str] = []
+
+    def _get_build_state(self) -> tuple[BuildState, str | None]:
+        state, content_hash = super()._get_build_state()
+        LoggedModifyRule.log.append(state)
+        return state, content_hash
+
+    def _do_modification(self, content_hash: str | None) -> None:
+        LoggedModifyRule.log.append("modified")
+        super()._do_modification(content_hash)
+
+
+def write(path: str, text: str, mtime_ns: int) -> None:
+    with open(path, "w") as f:
+        f.write(text)
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def make_logged_build_system() -> BuildSystem:
+    modification = FileModificationNode(StaticFileNode("f.txt"), "append_b")
+    return BuildSystem([LoggedModifyRule(modification, [StaticFileNode("in.txt")], append_b)])
+
+
+def logged_build() -> list[BuildState | str]:
+    LoggedModifyRule.log.clear()
+    make_logged_build_system().build()
+    return list(LoggedModifyRule.log)
+
+
+def test_subclass_overriding_build_state_and_modification():
+    write("f.txt", "a", 1_000_000_000)
+    write("in.txt", "1", 1_000_000_000)
+    assert logged_build() == [BuildState.CLEAN, "modified"]
+    assert read("f.txt") == "ab"
+
+    # The modified file is changed, and the rule is executed since it's dependency changed as well:
+    write("f.txt", "ax", 2_000_000_000)
+    write("in.txt", "2", 5_000_000_000_000_000_000)
+    assert logged_build() == [BuildState.DIRTY, "modified"]
+    assert read("f.txt") == "ab"
+
+    make_logged_build_system().clean()
+    assert read("f.txt") == "a"
+    assert logged_build() == [BuildState.CLEAN, "modified"]
+    assert read("f.txt") == "ab"
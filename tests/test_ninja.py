@@ -0,0 +1,74 @@
+"""
+Build systems of shell rules between files can be emitted as Ninja build files, and built by Ninja.
+"""
+import os
+import shutil
+
+import pytest
+
+from makeapi import (
+    BuildSystem, CompileRule, CreatedFileNode, CreationRule, FileModificationNode, ShellFileModifyRule, ShellRule, StaticFileNode,
+)
+
+
+def touch(*paths: str) -> None:
+    for path in paths:
+        with open(path, "w"):
+            pass
+
+
+def read(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+def test_emitted_paths_and_dependencies():
+    touch("main file.c", "cost$.h")
+    obj = CreatedFileNode("out:main.o")
+    BuildSystem([
+        CompileRule(obj, [StaticFileNode("main file.c")], [StaticFileNode("cost$.h")], compiler="gcc", flags=["-DPRICE=$5", "-c"]),
+        ShellRule(CreatedFileNode("list.txt"), [obj], "ls out:main.o > list.txt"),
+    ]).emit_ninja()
+
+    assert read("build.ninja") == (
+        "rule compile_0\n"
+        "  command = gcc $flags $in -o $out\n"
+        "\n"
+        "rule shell\n"
+        "  command = $cmd\n"
+        "\n"
+        "build out$:main.o: compile_0 main$ file.c | cost$$.h\n"
+        "  flags = '-DPRICE=$$5' -c\n"
+        "\n"
+        "build list.txt: shell out$:main.o\n"
+        "  cmd = ls out:main.o > list.txt\n"
+    )
+
+
+class PythonRule(CreationRule):
+    def execute(self) -> None:
+        touch(self.target.get_id())
+
+
+@pytest.mark.parametrize("make_rule", [
+    lambda: ShellFileModifyRule(FileModificationNode(StaticFileNode("src.txt"), "upper"), [], "tr a-z A-Z < src.txt > tmp && mv tmp src.txt"),
+    lambda: PythonRule(CreatedFileNode("out.txt"), [StaticFileNode("src.txt")]),
+])
+def test_rules_which_ninja_cannot_run_are_rejected(make_rule):
+    touch("src.txt")
+    with pytest.raises(ValueError, match="cannot be expressed in Ninja"):
+        BuildSystem([make_rule()]).emit_ninja()
+
+
+@pytest.mark.skipif(shutil.which("ninja") is None, reason="Ninja is not installed")
+def test_build_with_ninja():
+    with open("src.txt", "w") as f:
+        f.write("text")
+    copy = CreatedFileNode("copy.txt")
+    system = BuildSystem([
+        ShellRule(copy, [StaticFileNode("src.txt")], "cp src.txt copy.txt"),
+        ShellRule(CreatedFileNode("unused.txt"), [], "touch unused.txt"),
+    ])
+    system.build_with_ninja(copy)
+    assert read("copy.txt") == "text"
+    assert not os.path.exists("unused.txt") # Only the requested target is built
@@ -0,0 +1,85 @@
+"""
+Builds in which none of the required nodes changed since the target was last built are skipped, without checking any rule.
+"""
+import os
+
+import pytest
+
+from makeapi import BuildSystem, CreatedFileNode, CreationRule, StaticFileNode, StaticNode
+
+SETTING_TIMES: dict[str, int] = dict()
+
+
+class SettingNode(StaticNode):
+    """A static node which is not a file (e.g. a setting of the environment), so rules depending on it are not checked by content"""
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def get_id(self) -> str:
+        return self.name
+
+    def get_time(self) -> int | None:
+        return SETTING_TIMES[self.name]
+
+    def _check_exists(self) -> str | None:
+        return None
+
+
+class RecordingRule(CreationRule):
+    executed: list[str] = []
+
+    def execute(self) -> None:
+        RecordingRule.executed.append(self.target.get_id())
+        with open(self.target.get_id(), "w"):
+            pass
+
+
+@pytest.fixture
+def make_build_system():
+    RecordingRule.executed.clear()
+    with open("src", "w"):
+        pass
+    # The setting is newer than any target, so the rules are executed whenever they are checked:
+    SETTING_TIMES["env"] = 5_000_000_000_000_000_000
+    def make() -> BuildSystem:
+        a, env = CreatedFileNode("a"), SettingNode("env")
+        return BuildSystem([
+            RecordingRule(a, [StaticFileNode("src"), env]),
+            RecordingRule(CreatedFileNode("b"), [a, env]),
+        ])
+    return make
+
+
+def build(system: BuildSystem, target: str | None = None) -> list[str]:
+    """Returns the targets of the rules which were executed"""
+    RecordingRule.executed.clear()
+    system.build(None if target is None else CreatedFileNode(target))
+    return list(RecordingRule.executed)
+
+
+def test_unchanged_build_is_skipped(make_build_system):
+    assert build(make_build_system()) == ["a", "b"]
+    assert build(make_build_system()) == []
+
+
+@pytest.mark.parametrize("change", [
+    lambda: os.utime("src", ns=(1_000_000_000, 1_000_000_000)),
+    lambda: SETTING_TIMES.update(env=6_000_000_000_000_000_000),
+    lambda: os.remove("a"),
+    lambda: os.remove("b"),
+])
+def test_changed_node_is_built(make_build_system, change):
+    build(make_build_system())
+    change()
+    assert build(make_build_system()) != []
+
+
+def test_snapshots_of_targets_are_separate(make_build_system):
+    system = make_build_system()
+    assert build(system) == ["a", "b"]
+    assert build(system, "a") == ["a"] # Not built as a target on it's own yet
+    assert build(system, "a") == []
+
+    os.remove("b") # Only required when building all nodes
+    assert build(system, "a") == []
+    assert build(system) == ["a", "b"]
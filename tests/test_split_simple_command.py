@@ -0,0 +1,44 @@
+"""
+Command lines are only executed without a shell when the shell would not change their meaning.
+"""
+import pytest
+
+from makeapi import split_simple_command
+
+
+@pytest.mark.parametrize("cmd_line, argv", [
+    ("gcc -c main.c -o main.o", ["gcc", "-c", "main.c", "-o", "main.o"]),
+    ("  cp   a    b ", ["cp", "a", "b"]),
+    ("cp 'a file' \"another file\"", ["cp", "a file", "another file"]),
+    ("gcc -DNAME='\"value\"' main.c", ["gcc", "-DNAME=\"value\"", "main.c"]),
+    ("env", ["env"]),
+])
+def test_simple_commands_are_split(cmd_line, argv):
+    assert split_simple_command(cmd_line) == argv
+
+
+@pytest.mark.parametrize("cmd_line", [
+    "", # Nothing to execute
+    "   ",
+    "echo hello", # Builtins
+    "cd build",
+    "test -f a",
+    "export A=1",
+    "if true",
+    "CC=gcc make", # Assignments
+    "A=1",
+    "gcc *.c", # Shell syntax
+    "cat a > b",
+    "cat a | grep b",
+    "make && make install",
+    "make; make install",
+    "echo $HOME",
+    "cp `which gcc` .",
+    "cp ~/a b",
+    "gcc main.c # comment",
+    "cp a b\ncp b c",
+    "cp 'a b", # Unbalanced quotes
+    'cp "a b',
+])
+def test_commands_relying_on_the_shell_are_not_split(cmd_line):
+    assert split_simple_command(cmd_line) is None
@@ -0,0 +1,109 @@
+"""
+Build scripts extend the node and rule classes, which should keep working when makeapi is compiled with mypyc.
+"""
+import os
+
+import pytest
+
+from makeapi import (
+    BuildSystem, CreatedFileNode, CreationRule, DynamicNode, FileModificationNode, FileModifyRule, Rule, ShellRule, StaticFileNode, StaticNode,
+)
+
+
+class WriteRule(CreationRule):
+    def __init__(self, target: CreatedFileNode, text: str) -> None:
+        super().__init__(target, [])
+        self.text = text
+
+    def execute(self) -> None:
+        with open(self.target.path, "w") as f:
+            f.write(self.text)
+
+
+class UpperModifyRule(FileModifyRule):
+    def _file_modification(self) -> None:
+        path = self.modification.modified_file.path
+        with open(path) as f:
+            text = f.read()
+        with open(path, "w") as f:
+            f.write(text.upper())
+
+
+class MemoryNode(DynamicNode):
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.created: int | None = None
+
+    def get_id(self) -> str:
+        return f"memory:{self.name}"
+
+    def get_time(self) -> int | None:
+        return self.created
+
+    def clean(self) -> None:
+        self.created = None
+
+
+class MemoryRule(Rule):
+    def execute(self) -> None:
+        self.target.created = 1 << 62
+
+
+class EnvNode(StaticNode):
+    def __init__(self, var: str) -> None:
+        self.var = var
+
+    def get_id(self) -> str:
+        return f"env:{self.var}"
+
+    def get_time(self) -> int | None:
+        return 0
+
+    def _check_exists(self) -> str | None:
+        return None if self.var in os.environ else "Not set"
+
+
+class LoggedFileNode(CreatedFileNode):
+    cleaned: list[str] = []
+
+    def clean(self) -> None:
+        self.cleaned.append(self.path)
+        super().clean()
+
+
+def test_subclassed_rules_and_nodes_build():
+    with open("src.txt", "w") as f:
+        f.write("hello")
+    upper = FileModificationNode(StaticFileNode("src.txt"), "upper")
+    out = CreatedFileNode("out.txt")
+    memory = MemoryNode("x")
+    bs = BuildSystem([UpperModifyRule(upper, []), WriteRule(out, "text"), MemoryRule(memory, [upper, out])])
+
+    bs.build()
+    with open("src.txt") as f:
+        assert f.read() == "HELLO"
+    assert os.path.exists("out.txt")
+    assert memory.created is not None
+
+    bs.clean()
+    with open("src.txt") as f:
+        assert f.read() == "hello"
+    assert not os.path.exists("out.txt")
+    assert memory.created is None
+
+
+def test_subclassed_file_node_and_static_node(monkeypatch):
+    monkeypatch.setenv("MAKEAPI_TEST_VAR", "1")
+    logged = LoggedFileNode("logged.txt")
+    bs = BuildSystem([ShellRule(logged, [EnvNode("MAKEAPI_TEST_VAR")], ["touch", "logged.txt"])])
+
+    bs.build()
+    assert os.path.exists("logged.txt")
+    bs.clean()
+    assert LoggedFileNode.cleaned == ["logged.txt"]
+    assert not os.path.exists("logged.txt")
+
+
+def test_subclassed_static_node_is_verified():
+    with pytest.raises(RuntimeError, match="env:MAKEAPI_TEST_UNSET_VAR"):
+        BuildSystem([ShellRule(CreatedFileNode("x"), [EnvNode("MAKEAPI_TEST_UNSET_VAR")], "true")])